@@ -1,10 +1,17 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, Response, g, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, g, jsonify, stream_with_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_caching import Cache
+from cachetools import TLRUCache, TTLCache
 from datetime import date
-from sqlalchemy import func
+from sqlalchemy import func, case, select, and_, event, update, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import selectinload, raiseload, joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import io
 import csv
+import threading
+import time
 
 # --- App aur Database Setup ---
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -17,12 +24,32 @@ if database_url:
     # Hum live (Render) par hain aur PostgreSQL use kar rahe hain
     # Render compatibility ke liye 'postgres://' ko 'postgresql://' se replace karein
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url.replace("postgres://", "postgresql://")
+    # Connections reuse karo (har request par naya TCP+TLS setup nahi); pre_ping dead connections pakadta hai
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
 else:
     # Hum local hain. Project folder mein hi SQLite rakho.
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'students.db')
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
+# Subject wale bonus routes ke results cache karne ke liye (grade add/delete par invalidate hote hain)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+# --- Stats Formulas ---
+# Student methods aur list routes (counters seedha select karke) dono yahi use karte hain
+def average_from_totals(grades_sum, grades_count):
+    if not grades_count: return 0.0
+    return round(grades_sum / grades_count, 2)
+
+def attendance_percentage_from_counts(present_days, total_days):
+    if not total_days:
+        return 100.0
+    return round((present_days / total_days) * 100, 2)
 
 # --- Database Models ---
 
@@ -33,33 +60,17 @@ class Student(db.Model):
     grades = db.relationship('Grade', backref='student', lazy=True, cascade="all, delete-orphan")
     attendance_records = db.relationship('Attendance', backref='student', lazy=True, cascade="all, delete-orphan")
 
+    # Running aggregates: grade/attendance likhte waqt update hote hain, taaki padhte waqt query na lage
+    grades_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    grades_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    present_days = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_days = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     def calculate_average(self):
-        if not self.grades: return 0.0
-        total = sum(grade.score for grade in self.grades)
-        return round(total / len(self.grades), 2)
+        return average_from_totals(self.grades_sum, self.grades_count)
 
     def calculate_attendance_percentage(self):
-        total_days = db.session.query(func.count(Attendance.date.distinct())).filter_by(student_id=self.id).scalar()
-        if not total_days or total_days == 0:
-            return 100.0
-        
-        present_days = db.session.query(func.count(Attendance.id)).filter_by(student_id=self.id, status='Present').scalar()
-        # Ensure we count unique dates for total_days calculation to be accurate across all students
-        # The logic above is okay for a single student, but if a student has multiple entries for one date (due to error), it might be wrong.
-        # A simple fix for this specific student's calculation:
-        present_days = db.session.query(func.count(Attendance.date.distinct())).filter_by(student_id=self.id, status='Present').scalar()
-
-        # Recalculate total_days to ensure it's accurate:
-        # We need the max number of unique dates for which attendance was marked for ANY student, but for simplicity, 
-        # using the student's own marked days is acceptable here, assuming attendance is marked for all on the same days.
-        # Let's stick to the simpler version for a student's own percentage:
-        all_marked_days = db.session.query(func.count(Attendance.id)).filter_by(student_id=self.id).scalar()
-        if not all_marked_days or all_marked_days == 0:
-             return 100.0
-        present_days = db.session.query(func.count(Attendance.id)).filter_by(student_id=self.id, status='Present').scalar()
-
-
-        return round((present_days / all_marked_days) * 100, 2)
+        return attendance_percentage_from_counts(self.present_days, self.total_days)
 
     def __repr__(self):
         return f'<Student {self.name} (Roll: {self.roll_number})>'
@@ -69,13 +80,20 @@ class Grade(db.Model):
     subject = db.Column(db.String(100), nullable=False)
     score = db.Column(db.Integer, nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    # Subject wale aggregates aur topper (ORDER BY score DESC) ke liye covering index
+    __table_args__ = (db.Index('ix_grade_subject_score', 'subject', 'score'),)
 
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, default=date.today)
     status = db.Column(db.String(10), nullable=False) # 'Present' ya 'Absent'
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    __table_args__ = (db.UniqueConstraint('date', 'student_id', name='_date_student_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('date', 'student_id', name='_date_student_uc'),
+        # Counters recompute (student_id, aur student_id + status) ke liye; unique constraint
+        # date se shuru hota hai, toh sirf student_id wali lookup use nahi kar sakti
+        db.Index('ix_att_student_status', 'student_id', 'status'),
+    )
 
 # --- DB Init Command ---
 @app.cli.command('init-db')
@@ -84,29 +102,115 @@ def init_db_command():
         db.create_all()
     print('Initialized the database.')
 
+# Purane database par naye indexes banane ke liye (create_all existing tables ko touch nahi karta)
+@app.cli.command('create-indexes')
+def create_indexes_command():
+    with app.app_context():
+        for model in (Grade, Attendance):
+            for index in model.__table__.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+    print('Indexes created.')
+
+# Purane database ka upgrade: student table mein running counter columns add karo aur unhe
+# Grade/Attendance tables se bharo. Naye code ko deploy karne se pehle ek baar chalana zaroori hai.
+STUDENT_STAT_COLUMNS = ('grades_sum', 'grades_count', 'present_days', 'total_days')
+
+@app.cli.command('migrate-student-stats')
+def migrate_student_stats_command():
+    with app.app_context():
+        # Purane database mein columns nahi honge (create_all existing table ko alter nahi karta)
+        existing_columns = {col['name'] for col in inspect(db.engine).get_columns('student')}
+        with db.engine.begin() as conn:
+            for column in STUDENT_STAT_COLUMNS:
+                if column not in existing_columns:
+                    conn.execute(text(f'ALTER TABLE student ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0'))
+
+        grade_rows = db.session.query(
+            Grade.student_id, func.sum(Grade.score), func.count(Grade.id)
+        ).group_by(Grade.student_id).all()
+        attendance_rows = db.session.query(
+            Attendance.student_id,
+            func.sum(case((Attendance.status == 'Present', 1), else_=0)),
+            func.count(Attendance.id)
+        ).group_by(Attendance.student_id).all()
+
+        db.session.execute(update(Student).values({column: 0 for column in STUDENT_STAT_COLUMNS}))
+        if grade_rows:
+            db.session.execute(update(Student), [
+                {'id': sid, 'grades_sum': total, 'grades_count': count}
+                for sid, total, count in grade_rows
+            ])
+        if attendance_rows:
+            db.session.execute(update(Student), [
+                {'id': sid, 'present_days': present, 'total_days': count}
+                for sid, present, count in attendance_rows
+            ])
+        db.session.commit()
+    print('Student stats columns added and backfilled.')
+
+# --- Debug Guards (N+1 regressions pakadne ke liye) ---
+QUERY_COUNT_WARN_THRESHOLD = 5
+
+def with_lazyload_guard(*options):
+    # Sirf export_backup use karta hai; index aur chart-data ab columns select karte hain, ORM objects nahi.
+    # Debug mode mein baaki sab relationships par raiseload, taaki galti se lazy load ho toh error aaye
+    if app.debug:
+        return options + (raiseload('*'),)
+    return options
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_queries(conn, cursor, statement, parameters, context, executemany):
+    # Production mein turant return; app.debug import ke baad (app.run(debug=True)) set hota hai,
+    # isliye listener ko registration ke waqt gate nahi kar sakte
+    if not app.debug:
+        return
+    if has_request_context() and '_query_count' in g:
+        g._query_count += 1
+
+@app.before_request
+def start_query_counter():
+    if app.debug:
+        g._query_count = 0
+
+# after_request streamed responses (export_backup) ke generator se pehle chalta hai;
+# teardown_request tab chalta hai jab stream poora ho jaye, toh saari queries count hoti hain
+@app.teardown_request
+def report_query_count(exc):
+    count = g.get('_query_count')
+    if count is not None and count > QUERY_COUNT_WARN_THRESHOLD:
+        app.logger.warning('%s %s ne %d queries chalayi', request.method, request.path, count)
+
 # --- Web Routes ---
 
 @app.route('/')
 def index():
-    students = Student.query.all()
     today = date.today()
-    
-    # Check attendance for TODAY for any student to see if it's marked
-    attendance_today = Attendance.query.filter_by(date=today).first()
-    is_attendance_marked = (attendance_today is not None)
+    # Template ko sirf id, name, roll number aur aaj ka status chahiye -- poore ORM objects
+    # aur har student ki saari attendance history load karne ki zaroorat nahi
+    students = db.session.query(
+        Student.id, Student.name, Student.roll_number,
+        Attendance.status.label('today_status')
+    ).outerjoin(
+        Attendance, and_(Attendance.student_id == Student.id, Attendance.date == today)
+    ).all()
     
     # Dashboard Stats Calculation
     total_students = len(students)
     
+    # Saare dashboard aggregates ek hi query mein: aaj attendance marked hai ya nahi (EXISTS),
+    # aaj ka present count, aur class average Student ke running counters se (Grade table scan nahi)
+    is_attendance_marked, present_today_count, class_grades_sum, class_grades_count = db.session.query(
+        db.session.query(Attendance).filter_by(date=today).exists(),
+        select(func.count(Attendance.id))
+            .where(Attendance.date == today, Attendance.status == 'Present')
+            .scalar_subquery(),
+        func.coalesce(func.sum(Student.grades_sum), 0),
+        func.coalesce(func.sum(Student.grades_count), 0)
+    ).select_from(Student).one()
+    is_attendance_marked = bool(is_attendance_marked)
+    
     # Calculate Class Average Score
-    all_grades = Grade.query.all()
-    if all_grades:
-        class_avg_score = round(sum(grade.score for grade in all_grades) / len(all_grades), 2)
-    else:
-        class_avg_score = 0.0
-
-    # Calculate Today's Attendance Count and Insights Count
-    present_today_count = Attendance.query.filter_by(date=today, status='Present').count()
+    class_avg_score = average_from_totals(class_grades_sum, class_grades_count)
     
     # Temporary way to count insights (not perfect as flashes are ephemeral, but needed for the stat card)
     # Since insights are only calculated when adding a grade, we can't get a real-time count easily without
@@ -126,6 +230,13 @@ def index():
         insights_count=insights_count # Placeholder
     )
 
+def parse_int(value):
+    # int() se pehle sasta check: galat input (bots, form retries) par ValueError banane ki zaroorat nahi
+    value = value.strip() if value else ''
+    digits = value[1:] if value[:1] in ('+', '-') else value
+    # 9 digits tak hi: DB Integer range ke andar, aur int() ki 4300-digit limit wala ValueError bhi nahi
+    return int(value) if digits.isdecimal() and len(digits) <= 9 else None
+
 @app.route('/add_student', methods=['POST'])
 def add_student():
     try:
@@ -136,7 +247,10 @@ def add_student():
             flash('Roll Number is required!', 'warning')
             return redirect(url_for('index'))
             
-        roll_number = int(roll_number_str)
+        roll_number = parse_int(roll_number_str)
+        if roll_number is None:
+            flash('Invalid Roll Number! Please enter a number.', 'danger')
+            return redirect(url_for('index'))
 
         existing_student = Student.query.filter_by(roll_number=roll_number).first()
         if existing_student:
@@ -151,8 +265,6 @@ def add_student():
         db.session.add(new_student)
         db.session.commit()
         flash(f'Student {name} added successfully!', 'success')
-    except ValueError:
-        flash('Invalid Roll Number! Please enter a number.', 'danger')
     except Exception as e:
         db.session.rollback()
         flash(f'Error adding student: {e}', 'danger')
@@ -172,6 +284,59 @@ def view_student_details(student_id):
     )
 
 # --- Smart Logic ---
+# Subject-wise (count, sum) ka in-process cache. Naya grade aane par entry in-place update hoti hai
+# (count+1, sum+score); student delete hone par entry hat jaati hai. Cache har gunicorn worker ka
+# apna hai, dusre workers ke grades yahan nahi dikhte -- isliye har entry pehli baar DB se load hone ke
+# SUBJECT_STATS_TTL seconds baad expire hoti hai (in-place updates expiry aage nahi badhate).
+# Threaded workers ke liye lock ke saath. Entry ke saath uska load window (started, finished) bhi
+# rakhte hain, taaki pata chale kaunse commits us DB read mein pehle se shamil the.
+SUBJECT_STATS_TTL = 60
+subject_stats_cache = TLRUCache(maxsize=128, ttu=lambda subject, stats, now: stats[4], timer=time.monotonic)
+# Subject ka aakhri grade write (commit khatam hone ka time); purana miss-load isse pehle shuru hua ho
+# toh cache mein store nahi hota
+subject_last_write = TTLCache(maxsize=1024, ttl=SUBJECT_STATS_TTL, timer=time.monotonic)
+subject_stats_lock = threading.Lock()
+
+def get_subject_grade_stats(subject):
+    with subject_stats_lock:
+        stats = subject_stats_cache.get(subject)
+    if stats is not None:
+        return stats[:2]
+    # Subject ke grades ka count aur sum seedha DB se (saari rows Python mein laane ki zaroorat nahi)
+    load_started = time.monotonic()
+    grade_count, total_score = db.session.query(
+        func.count(Grade.id), func.sum(Grade.score)
+    ).filter(Grade.subject == subject).one()
+    load_finished = time.monotonic()
+    with subject_stats_lock:
+        last_write = subject_last_write.get(subject)
+        # Read shuru hone ke baad koi write commit hua ho toh result purana ho sakta hai -- store mat karo.
+        # Kisi aur thread ne beech mein entry daal di ho toh use overwrite mat karo (setdefault).
+        if last_write is None or last_write < load_started:
+            subject_stats_cache.setdefault(subject, (
+                grade_count, total_score, load_started, load_finished,
+                load_finished + SUBJECT_STATS_TTL
+            ))
+    return grade_count, total_score
+
+def record_subject_grade(subject, score, commit_started, commit_finished):
+    # Naye grade ko cached (count, sum) mein jodo, taaki agla insight check DB par na jaye
+    with subject_stats_lock:
+        subject_last_write[subject] = max(subject_last_write.get(subject, commit_finished), commit_finished)
+        stats = subject_stats_cache.get(subject)
+        if stats is None:
+            return
+        grade_count, total_score, load_started, load_finished, expires_at = stats
+        if load_finished < commit_started:
+            # Entry is commit se pehle load hui thi, grade usmein nahi hai
+            subject_stats_cache[subject] = (
+                grade_count + 1, (total_score or 0) + score, load_started, load_finished, expires_at
+            )
+        elif load_started <= commit_finished:
+            # Read aur commit overlap hue -- pata nahi grade shamil hai ya nahi, entry hata do
+            subject_stats_cache.pop(subject, None)
+        # Warna entry commit ke baad load hui thi aur grade pehle se gina hua hai
+
 def check_performance_insight(subject, new_score, student_object):
     LOW_SCORE_THRESHOLD = 50
     GOOD_SCORE_THRESHOLD = 80 
@@ -180,19 +345,14 @@ def check_performance_insight(subject, new_score, student_object):
 
     attendance_perc = student_object.calculate_attendance_percentage()
     
-    # Subject ke sabhi grades fetch karo (current student ko exclude karke if possible, but for class average, all grades are fine)
-    all_grades = Grade.query.filter(Grade.subject == subject).all()
+    grade_count, total_score = get_subject_grade_stats(subject)
     
-    # Ek list banao jismein sirf scores ho
-    subject_scores = [g.score for g in all_grades]
-    
-    if not subject_scores or len(subject_scores) < 2:
+    if grade_count < 2:
         # Sirf ek hi score hai ya koi nahi hai, toh class average meaningful nahi
         # isliye return kar do
         return 
 
-    total_score = sum(subject_scores)
-    class_average = round(total_score / len(subject_scores), 2)
+    class_average = round(total_score / grade_count, 2)
 
     # Rules (Class-wide, Low Marks + Low Attd, Low Marks + Good Attd, Good Marks + Low Attd)
     if new_score < LOW_SCORE_THRESHOLD and class_average < LOW_CLASS_AVG_THRESHOLD:
@@ -235,7 +395,10 @@ def add_grade(student_id):
              flash('Score is required!', 'warning')
              return redirect(url_for('view_student_details', student_id=student_id))
         
-        score = int(score_str)
+        score = parse_int(score_str)
+        if score is None:
+            flash('Invalid Score! Please enter a number.', 'danger')
+            return redirect(url_for('view_student_details', student_id=student_id))
 
         if not subject:
             flash('Subject is required!', 'warning')
@@ -244,13 +407,18 @@ def add_grade(student_id):
         else:
             new_grade = Grade(subject=subject, score=score, student=student)
             db.session.add(new_grade)
+            # Running counters same transaction mein (SQL expression, taaki concurrent writes safe rahein)
+            student.grades_sum = Student.grades_sum + score
+            student.grades_count = Student.grades_count + 1
+            commit_started = time.monotonic()
             db.session.commit()
+            # Naye grade se subject ke cached stats update karo aur routes ka cached result hatao
+            record_subject_grade(subject, score, commit_started, time.monotonic())
+            invalidate_subject_routes(subject)
             # Insight check commit ke baad hi karo
             check_performance_insight(subject, score, student) 
             flash(f'Grade for {subject} added successfully!', 'success')
             
-    except ValueError:
-        flash('Invalid Score! Please enter a number.', 'danger')
     except Exception as e:
         db.session.rollback()
         flash(f'Error adding grade: {e}', 'danger')
@@ -260,45 +428,87 @@ def add_grade(student_id):
 def delete_student(student_id):
     student = Student.query.get_or_404(student_id)
     try:
+        # Student ke grades bhi delete honge, toh unke subjects ka cache purana ho jayega
+        subjects = {grade.subject for grade in student.grades}
         db.session.delete(student)
         db.session.commit()
+        for subject in subjects:
+            invalidate_subject_cache(subject)
         flash(f'Student {student.name} deleted successfully.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Error deleting student: {e}', 'danger')
     return redirect(url_for('index'))
 
+def recompute_attendance_counters(student_ids):
+    # Counters ko pehle wale SELECT ke snapshot se +/- karne ki jagah Attendance table se dobara ginte hain.
+    # Do submissions ek saath chalein (PostgreSQL upsert dono ke liye pass hota hai) toh bhi count galat nahi hota.
+    db.session.execute(
+        update(Student).where(Student.id.in_(student_ids)).values(
+            total_days=select(func.count(Attendance.id))
+                .where(Attendance.student_id == Student.id)
+                .scalar_subquery(),
+            present_days=select(func.count(Attendance.id))
+                .where(Attendance.student_id == Student.id, Attendance.status == 'Present')
+                .scalar_subquery()
+        )
+    )
+
 @app.route('/mark_attendance', methods=['POST'])
 def mark_attendance():
     attendance_date = date.today()
-    all_students = Student.query.all()
+    # Sirf ids chahiye, poore Student objects nahi
+    student_ids = [sid for (sid,) in Student.query.with_entities(Student.id).all()]
     
-    if not all_students:
+    if not student_ids:
         flash('Cannot mark attendance: No students found.', 'warning')
         return redirect(url_for('index'))
         
     try:
         # Ek check: Agar attendance pehle se marked hai, toh update karein
-        is_update = Attendance.query.filter_by(date=attendance_date).first() is not None
+        is_update = db.session.query(
+            db.session.query(Attendance).filter_by(date=attendance_date).exists()
+        ).scalar()
         
-        for student in all_students:
-            status = request.form.get(f'student_{student.id}')
-            
-            if not status:
-                # Agar koi student mark nahi hua, toh skip
-                continue
-
-            existing_record = Attendance.query.filter_by(
-                student_id=student.id, date=attendance_date
-            ).first()
-            
-            if existing_record:
-                existing_record.status = status
-            else:
-                new_record = Attendance(
-                    student_id=student.id, date=attendance_date, status=status
-                )
-                db.session.add(new_record)
+        # Form se {student_id: status}; jo student mark nahi hua use skip karo
+        updates = {}
+        for student_id in student_ids:
+            status = request.form.get(f'student_{student_id}')
+            if status:
+                updates[student_id] = status
+
+        if updates and db.engine.dialect.name == 'postgresql':
+            # PostgreSQL par ek hi statement mein upsert
+            stmt = pg_insert(Attendance).values([
+                {'student_id': sid, 'date': attendance_date, 'status': status}
+                for sid, status in updates.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint='_date_student_uc', set_={'status': stmt.excluded.status}
+            )
+            db.session.execute(stmt)
+        elif updates:
+            # Aaj ke existing records ek hi query mein, har student ke liye alag SELECT nahi
+            existing = {
+                record.student_id: record
+                for record in Attendance.query.filter(
+                    Attendance.date == attendance_date,
+                    Attendance.student_id.in_(updates)
+                ).all()
+            }
+            new_records = []
+            for student_id, status in updates.items():
+                if student_id in existing:
+                    existing[student_id].status = status
+                else:
+                    new_records.append(Attendance(
+                        student_id=student_id, date=attendance_date, status=status
+                    ))
+            db.session.bulk_save_objects(new_records)
+
+        if updates:
+            db.session.flush()
+            recompute_attendance_counters(list(updates))
         
         db.session.commit()
         
@@ -313,6 +523,7 @@ def mark_attendance():
 
 # --- Bonus Features ---
 @app.route('/class_average/<subject>')
+@cache.memoize(timeout=600)
 def class_average(subject):
     grades = Grade.query.filter_by(subject=subject).all()
     if not grades: 
@@ -322,47 +533,73 @@ def class_average(subject):
     return f"<h1>Class Average for {subject}: {average}</h1>"
 
 @app.route('/subject_topper/<subject>')
+@cache.memoize(timeout=600)
 def subject_topper(subject):
-    topper_grade = Grade.query.filter_by(subject=subject).order_by(Grade.score.desc()).first()
+    # Student ko JOIN se saath mein load karo, warna topper_grade.student alag SELECT chalata
+    topper_grade = Grade.query.options(joinedload(Grade.student)).filter_by(
+        subject=subject
+    ).order_by(Grade.score.desc()).first()
     if not topper_grade: 
         return f"<h1>No grades found for {subject}</h1>"
     topper_student = topper_grade.student
     return f"<h1>Topper in {subject} is {topper_student.name} (Roll: {topper_student.roll_number}) with {topper_grade.score} marks.</h1>"
 
+def invalidate_subject_routes(subject):
+    cache.delete_memoized(class_average, subject)
+    cache.delete_memoized(subject_topper, subject)
+
+def invalidate_subject_cache(subject):
+    with subject_stats_lock:
+        subject_stats_cache.pop(subject, None)
+        # Delete se pehle shuru hue miss-loads purane grades gin sakte hain, unhe store na hone do
+        subject_last_write[subject] = time.monotonic()
+    invalidate_subject_routes(subject)
+
 @app.route('/export_backup')
 def export_backup():
-    si = io.StringIO()
-    cw = csv.writer(si)
     # Corrected headers
     headers = ['Roll Number', 'Name', 'Overall Average %', 'Attendance %', 'Subject', 'Score']
-    cw.writerow(headers)
-    students = Student.query.all()
-    
-    if not students:
-        cw.writerow(['No students found in the database.'])
-    
-    for student in students:
-        avg = student.calculate_average()
-        att_perc = student.calculate_attendance_percentage()
-        
-        # Ek single row mein student ki summary aur saare grades ke liye separate rows
-        if not student.grades:
-            # Summary row for students with no grades
-            cw.writerow([student.roll_number, student.name, avg, att_perc, 'N/A', 'N/A'])
-        else:
-            first_grade = True
-            for grade in student.grades:
-                if first_grade:
-                    # Pehli row mein summary details daalo
-                    cw.writerow([student.roll_number, student.name, avg, att_perc, grade.subject, grade.score])
-                    first_grade = False
-                else:
-                    # Baaki rows mein summary details blank rakho
-                    cw.writerow(['', '', '', '', grade.subject, grade.score])
 
-    output = si.getvalue()
+    def csv_line(row):
+        si = io.StringIO()
+        csv.writer(si).writerow(row)
+        return si.getvalue()
+
+    def generate():
+        # Poori file memory mein banane ki jagah rows stream karo
+        yield csv_line(headers)
+        # Grades har student ke liye chahiye, toh lazy load (N+1) ki jagah IN-query;
+        # yield_per se students 200 ke batches mein fetch hote hain
+        students = Student.query.options(
+            *with_lazyload_guard(selectinload(Student.grades))
+        ).yield_per(200)
+
+        found_any = False
+        for student in students:
+            found_any = True
+            avg = student.calculate_average()
+            att_perc = student.calculate_attendance_percentage()
+            
+            # Ek single row mein student ki summary aur saare grades ke liye separate rows
+            if not student.grades:
+                # Summary row for students with no grades
+                yield csv_line([student.roll_number, student.name, avg, att_perc, 'N/A', 'N/A'])
+            else:
+                first_grade = True
+                for grade in student.grades:
+                    if first_grade:
+                        # Pehli row mein summary details daalo
+                        yield csv_line([student.roll_number, student.name, avg, att_perc, grade.subject, grade.score])
+                        first_grade = False
+                    else:
+                        # Baaki rows mein summary details blank rakho
+                        yield csv_line(['', '', '', '', grade.subject, grade.score])
+
+        if not found_any:
+            yield csv_line(['No students found in the database.'])
+
     return Response(
-        output,
+        stream_with_context(generate()),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment;filename=student_backup.csv"}
     )
@@ -382,17 +619,21 @@ def get_chart_data():
     """
     Graphs banane ke liye data ko JSON format mein bhejta hai.
     """
-    students = Student.query.all()
+    # Averages aur attendance Student ke running counters se, Grade/Attendance tables touch nahi hoti
+    students = Student.query.with_entities(
+        Student.id, Student.name,
+        Student.grades_sum, Student.grades_count, Student.present_days, Student.total_days
+    ).all()
     
     labels = []    # Student ke naam (X-axis)
     avg_scores_data = [] # Data 1
     attendance_data = [] # Data 2
     scatter_data = []      # Data 3 (Attendance vs Score)
 
-    for student in students:
-        labels.append(student.name)
-        avg_score = student.calculate_average()
-        attendance_perc = student.calculate_attendance_percentage()
+    for student_id, name, grades_sum, grades_count, present_days, total_days in students:
+        labels.append(name)
+        avg_score = average_from_totals(grades_sum, grades_count)
+        attendance_perc = attendance_percentage_from_counts(present_days, total_days)
         
         avg_scores_data.append(avg_score)
         attendance_data.append(attendance_perc)
@@ -400,7 +641,7 @@ def get_chart_data():
         scatter_data.append({
             'x': attendance_perc,
             'y': avg_score,
-            'label': student.name # Point par hover karne se naam dikhega
+            'label': name # Point par hover karne se naam dikhega
         })
 
     return jsonify({